@@ -1,64 +1,227 @@
 import click
-from utils.db_utils import create_db_connections
+from decouple import config
+from utils.db_utils import create_analytical_db_connection
+from cli.profiler import QueryProfiler, RollingHistogram, read_profile_log, summarize_profile
 from cli.query_handler import QueryHandler
+from cli.schema_advisor import ADVISED_INDEX_SET, INDEX_SETS, SchemaAdvisor
 from utils.csv_utils import export_to_csv
 
+DEFAULT_PROFILE_LOG = config('QUERY_PROFILE_LOG', default='query_profile.jsonl')
+
 @click.group()
-def cli():
+@click.option('--profile', 'profile_enabled', is_flag=True,
+              help='Time query phases and append metrics to the profile log')
+@click.option('--explain-analyze', is_flag=True,
+              help='Capture EXPLAIN (ANALYZE, BUFFERS) plans while profiling')
+@click.option('--profile-log', default=DEFAULT_PROFILE_LOG, help='Profile log file (JSON lines)')
+@click.pass_context
+def cli(ctx, profile_enabled, explain_analyze, profile_log):
     """ACME Delivery Services Analytics CLI"""
-    pass
+    profiler = QueryProfiler(
+        log_path=profile_log,
+        enabled=profile_enabled or explain_analyze,
+        explain_analyze=explain_analyze
+    )
+    ctx.obj = profiler
+    ctx.call_on_close(lambda: _flush_profile(profiler))
+
+def _flush_profile(profiler):
+    """Flush buffered profile metrics, reporting write failures"""
+    if not profiler.flush():
+        click.echo(f"Error: could not write profile log {profiler.log_path}", err=True)
+
+def _export_query(profiler, query_name, output):
+    """Run a named query and export its results, timing each phase
+
+    Failed runs are recorded too, so timeouts and errors show up in the profile.
+    """
+    row_count = 0
+    error = None
+    try:
+        with profiler.phase('connect'):
+            target_db = create_analytical_db_connection(on_retry=profiler.count_connect_retry)
+        query_handler = QueryHandler(target_db, profiler)
+        results = getattr(query_handler, f"get_{query_name}")()
+        with profiler.phase('write'):
+            export_to_csv(results, output)
+        row_count = len(results)
+        return results
+    except Exception as e:
+        error = str(e)
+        raise
+    finally:
+        profiler.record(query_name, row_count, error=error)
 
 @cli.command()
 @click.option('--output', default='open_orders.csv', help='Output CSV file name')
-def open_orders(output):
+@click.pass_obj
+def open_orders(profiler, output):
     """Export open orders by delivery date and status"""
     try:
-        _, target_db = create_db_connections()
-        query_handler = QueryHandler(target_db)
-        results = query_handler.get_open_orders()
-        export_to_csv(results, output)
+        results = _export_query(profiler, 'open_orders', output)
         click.echo(f"Exported {len(results)} records to {output}")
     except Exception as e:
         click.echo(f"Error: {str(e)}", err=True)
 
 @cli.command()
 @click.option('--output', default='top_delivery_dates.csv', help='Output CSV file name')
-def top_delivery_dates(output):
+@click.pass_obj
+def top_delivery_dates(profiler, output):
     """Export top 3 delivery dates with most open orders"""
     try:
-        _, target_db = create_db_connections()
-        query_handler = QueryHandler(target_db)
-        results = query_handler.get_top_delivery_dates()
-        export_to_csv(results, output)
+        results = _export_query(profiler, 'top_delivery_dates', output)
         click.echo(f"Exported {len(results)} records to {output}")
     except Exception as e:
         click.echo(f"Error: {str(e)}", err=True)
 
 @cli.command()
 @click.option('--output', default='pending_items.csv', help='Output CSV file name')
-def pending_items(output):
+@click.pass_obj
+def pending_items(profiler, output):
     """Export pending items by product ID"""
     try:
-        _, target_db = create_db_connections()
-        query_handler = QueryHandler(target_db)
-        results = query_handler.get_pending_items()
-        export_to_csv(results, output)
+        results = _export_query(profiler, 'pending_items', output)
         click.echo(f"Exported {len(results)} records to {output}")
     except Exception as e:
         click.echo(f"Error: {str(e)}", err=True)
 
 @cli.command()
 @click.option('--output', default='top_customers.csv', help='Output CSV file name')
-def top_customers(output):
+@click.pass_obj
+def top_customers(profiler, output):
     """Export top 3 customers with most pending orders"""
     try:
-        _, target_db = create_db_connections()
-        query_handler = QueryHandler(target_db)
-        results = query_handler.get_top_customers()
-        export_to_csv(results, output)
+        results = _export_query(profiler, 'top_customers', output)
         click.echo(f"Exported {len(results)} records to {output}")
     except Exception as e:
         click.echo(f"Error: {str(e)}", err=True)
 
+def _format_ms(value):
+    """Format a latency column, leaving it blank when there are no timed runs"""
+    return f"{value:>10.2f}" if value is not None else f"{'-':>10}"
+
+@cli.command()
+@click.option('--window', default=100, type=click.IntRange(min=1),
+              help='Number of most recent runs per query to summarize')
+@click.pass_obj
+def profile(profiler, window):
+    """Summarize latency percentiles and plan regressions per query"""
+    try:
+        _flush_profile(profiler)
+        entries = read_profile_log(profiler.log_path)
+        if not entries:
+            click.echo(f"No profile entries in {profiler.log_path}")
+            return
+
+        summary = summarize_profile(entries, window=window)
+        click.echo(
+            f"{'query':<20} {'runs':>5} {'errors':>6} {'timed':>6} "
+            f"{'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}"
+        )
+        for query, stats in sorted(summary.items()):
+            click.echo(
+                f"{query:<20} {stats['runs']:>5} {stats['errors']:>6} {stats['timed_runs']:>6} "
+                f"{_format_ms(stats['p50'])} {_format_ms(stats['p95'])} {_format_ms(stats['p99'])}"
+            )
+            if stats['timed_runs']:
+                phases = ", ".join(f"{name}={ms:.2f}" for name, ms in stats['phases_p50'].items())
+                click.echo(f"  phases p50 ms: {phases}")
+            if stats['execution_p50'] is not None:
+                click.echo(
+                    f"  EXPLAIN ANALYZE p50 ms: planning={stats['planning_p50']:.2f}, "
+                    f"execution={stats['execution_p50']:.2f}"
+                )
+            buckets = []
+            for bound, count in stats['buckets'].items():
+                if count:
+                    label = f"<={bound}" if bound is not None else f">{RollingHistogram.BUCKETS_MS[-1]}"
+                    buckets.append(f"{label}: {count}")
+            if buckets:
+                click.echo(f"  latency histogram ms: {', '.join(buckets)}")
+            for regression in stats['regressions']:
+                click.echo(f"  PLAN REGRESSION: {regression}")
+    except FileNotFoundError:
+        click.echo(f"Error: profile log {profiler.log_path} not found", err=True)
+    except Exception as e:
+        click.echo(f"Error: {str(e)}", err=True)
+
+def _benchmark_index_set(advisor, index_set, indexes, upserts, repeat):
+    """Benchmark an index set against the current one and print the deltas"""
+    sample = advisor.sample_orders(upserts)
+    baseline = advisor.benchmark(advisor.resolve_index_set('current'), sample, repeat)
+    candidate = advisor.benchmark(indexes, sample, repeat)
+
+    click.echo(f"\n{'query':<20} {'current ms':>12} {index_set + ' ms':>12} {'delta':>8}")
+    for name, stats in baseline['queries'].items():
+        current_ms = stats['latency_ms']
+        candidate_ms = candidate['queries'][name]['latency_ms']
+        delta = (candidate_ms - current_ms) / current_ms * 100 if current_ms else 0.0
+        click.echo(f"{name:<20} {current_ms:>12.2f} {candidate_ms:>12.2f} {delta:>+7.1f}%")
+        for index_scan in candidate['queries'][name]['index_scans']:
+            click.echo(f"  {index_scan}")
+    current_rate = baseline['upserts_per_sec']
+    candidate_rate = candidate['upserts_per_sec']
+    delta = (candidate_rate - current_rate) / current_rate * 100 if current_rate else 0.0
+    click.echo(
+        f"{'upserts/s':<20} {current_rate:>12.1f} {candidate_rate:>12.1f} {delta:>+7.1f}%"
+    )
+
+@cli.command()
+@click.option('--upserts', default=500, type=click.IntRange(min=1),
+              help='Number of sampled orders replayed as CDC upserts')
+@click.option('--repeat', default=5, type=click.IntRange(min=1),
+              help='Timed runs per query and upsert passes per index set')
+@click.option('--index-set', default=ADVISED_INDEX_SET,
+              type=click.Choice(sorted(INDEX_SETS) + [ADVISED_INDEX_SET]),
+              help='Index set to compare against the current one and to apply')
+@click.option('--migration-file', default=None, help='Write the migration for the index set to this file')
+@click.option('--apply', is_flag=True, help='Apply the index set to the analytics database')
+@click.option('--skip-benchmark', is_flag=True,
+              help='Only report index usage, write the migration and/or apply the index set')
+def schema_advisor(upserts, repeat, index_set, migration_file, apply, skip_benchmark):
+    """Benchmark the fact_orders index set and propose a leaner one"""
+    try:
+        target_db = create_analytical_db_connection()
+        advisor = SchemaAdvisor(target_db)
+
+        click.echo("Secondary indexes on analytics.fact_orders:")
+        stats = advisor.index_stats()
+        for index in stats:
+            notes = []
+            if index['idx_scan'] == 0:
+                notes.append("unused")
+            if index['duplicate_of']:
+                notes.append(f"duplicate of {index['duplicate_of']}")
+            if index['low_selectivity']:
+                notes.append("low selectivity single-column index")
+            click.echo(
+                f"  {index['index_name']:<40} scans={index['idx_scan']:<8} "
+                f"size={index['size_bytes'] // 1024}kB {', '.join(notes)}"
+            )
+
+        indexes = advisor.resolve_index_set(index_set, stats)
+        if index_set == ADVISED_INDEX_SET:
+            click.echo(
+                f"\nIndex set '{index_set}' (existing indexes minus unused, duplicate and "
+                f"low selectivity ones, plus the 'lean' partial indexes):"
+            )
+        else:
+            click.echo(f"\nIndex set '{index_set}' (fixed candidate, not derived from index usage):")
+        for name, definition in indexes.items():
+            click.echo(f"  {name} ON analytics.fact_orders {definition}")
+
+        if not skip_benchmark:
+            _benchmark_index_set(advisor, index_set, indexes, upserts, repeat)
+
+        if migration_file:
+            with open(migration_file, 'w') as migration:
+                migration.write(advisor.migration_sql(indexes))
+            click.echo(f"Wrote migration for index set '{index_set}' to {migration_file}")
+        if apply:
+            advisor.apply(indexes)
+            click.echo(f"Applied index set '{index_set}' to analytics.fact_orders")
+    except Exception as e:
+        click.echo(f"Error: {str(e)}", err=True)
+
 if __name__ == "__main__":
     cli()
@@ -0,0 +1,231 @@
+import json
+import logging
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+PHASES = ('connect', 'plan', 'execute', 'fetch', 'write')
+
+# The plan phase is the extra EXPLAIN round-trip added by profiling; the query
+# is planned again (and with ANALYZE, executed again) in the execute phase
+OVERHEAD_PHASES = ('plan',)
+
+# Scans that should never show up in a plan for the CLI queries
+WATCHED_SEQ_SCANS = ('fact_orders_default',)
+
+
+class QueryProfiler:
+    """Times query phases and buffers metrics into a JSON lines log"""
+
+    def __init__(self, log_path='query_profile.jsonl', enabled=False,
+                 explain_analyze=False, buffer_size=50):
+        self.log_path = log_path
+        self.enabled = enabled
+        self.explain_analyze = explain_analyze
+        self.buffer_size = buffer_size
+        self._buffer = []
+        self._phases = {}
+        self._plan = None
+        self._connect_retries = 0
+
+    @contextmanager
+    def phase(self, name):
+        """Time a single phase of the current query"""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self._phases[name] = self._phases.get(name, 0.0) + elapsed_ms
+
+    def explain_statement(self, query):
+        """Return the EXPLAIN statement used to capture the plan of a query"""
+        options = 'ANALYZE, BUFFERS, FORMAT JSON' if self.explain_analyze else 'FORMAT JSON'
+        return f"EXPLAIN ({options}) {query}"
+
+    def count_connect_retry(self):
+        """Count a failed connection attempt of the current query"""
+        self._connect_retries += 1
+
+    def attach_plan(self, plan):
+        """Attach the JSON plan returned by EXPLAIN to the current query"""
+        self._plan = plan[0] if isinstance(plan, list) else plan
+
+    def record(self, query_name, row_count, error=None):
+        """Buffer the metrics collected for the current query"""
+        if not self.enabled:
+            return
+        plan = self._plan or {}
+        entry = {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'query': query_name,
+            'rows': row_count,
+            'error': error,
+            'connect_retries': self._connect_retries,
+            'phases_ms': {name: round(ms, 3) for name, ms in self._phases.items()},
+            'total_ms': round(sum(
+                ms for name, ms in self._phases.items() if name not in OVERHEAD_PHASES
+            ), 3),
+            'scans': extract_scans(plan.get('Plan', {})),
+            'explain_analyze': self.explain_analyze,
+            'plan': plan,
+        }
+        if 'Planning Time' in plan:
+            entry['planning_ms'] = plan['Planning Time']
+        if 'Execution Time' in plan:
+            entry['execution_ms'] = plan['Execution Time']
+
+        self._buffer.append(entry)
+        self._phases = {}
+        self._plan = None
+        self._connect_retries = 0
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        """Append buffered metrics to the log file
+
+        Returns:
+            bool: False if the log could not be written
+        """
+        if not self._buffer:
+            return True
+        try:
+            with open(self.log_path, 'a') as log_file:
+                for entry in self._buffer:
+                    log_file.write(json.dumps(entry, default=str) + "\n")
+            self._buffer = []
+            return True
+        except OSError as e:
+            logger.error(f"Error writing query profile log: {str(e)}")
+            return False
+
+
+class RollingHistogram:
+    """Latency histogram over the most recent samples of a query"""
+
+    BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+    def __init__(self, window=100):
+        self.samples = deque(maxlen=window)
+
+    def add(self, latency_ms):
+        self.samples.append(latency_ms)
+
+    def percentile(self, p):
+        """Nearest-rank percentile of the samples in the window"""
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        rank = max(1, -(-len(ordered) * p // 100))
+        return ordered[int(rank) - 1]
+
+    def buckets(self):
+        """Count samples per upper bound bucket, with None as overflow"""
+        counts = {bound: 0 for bound in self.BUCKETS_MS + (None,)}
+        for sample in self.samples:
+            bound = next((b for b in self.BUCKETS_MS if sample <= b), None)
+            counts[bound] += 1
+        return counts
+
+
+def extract_scans(plan_node):
+    """Collect (node type, relation) pairs for every scan in a plan tree"""
+    scans = []
+    if not plan_node:
+        return scans
+    if 'Relation Name' in plan_node:
+        scans.append([plan_node['Node Type'], plan_node['Relation Name']])
+    for child in plan_node.get('Plans', []):
+        scans.extend(extract_scans(child))
+    return scans
+
+
+def read_profile_log(log_path):
+    """Read all entries of a JSON lines profile log"""
+    entries = []
+    with open(log_path) as log_file:
+        for line_number, line in enumerate(log_file, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                logger.warning(f"Skipping malformed profile entry at line {line_number}")
+    return entries
+
+
+def summarize_profile(entries, window=100):
+    """Summarize latency percentiles and plan regressions per query
+
+    Latency percentiles only cover successful runs without EXPLAIN ANALYZE, so
+    failures (counted separately) and doubled executions do not skew them.
+
+    Args:
+        entries (list): Profile log entries in the order they were written
+        window (int): Number of most recent runs kept per query
+
+    Returns:
+        dict: Summary keyed by query name
+    """
+    histograms = defaultdict(lambda: RollingHistogram(window))
+    errors = defaultdict(lambda: deque(maxlen=window))
+    phase_histograms = defaultdict(lambda: defaultdict(lambda: RollingHistogram(window)))
+    planning_histograms = defaultdict(lambda: RollingHistogram(window))
+    execution_histograms = defaultdict(lambda: RollingHistogram(window))
+    baseline_scans = {}
+    latest_scans = {}
+
+    for entry in entries:
+        query = entry['query']
+        errors[query].append(bool(entry.get('error')))
+        if 'planning_ms' in entry:
+            planning_histograms[query].add(entry['planning_ms'])
+        if 'execution_ms' in entry:
+            execution_histograms[query].add(entry['execution_ms'])
+        scans = {tuple(scan) for scan in entry.get('scans', [])}
+        if scans:
+            baseline_scans.setdefault(query, scans)
+            latest_scans[query] = scans
+
+        if not entry.get('error') and not entry.get('explain_analyze'):
+            histograms[query].add(entry['total_ms'])
+            for name, ms in entry.get('phases_ms', {}).items():
+                phase_histograms[query][name].add(ms)
+
+    summary = {}
+    for query in errors:
+        histogram = histograms[query]
+        regressions = []
+        latest = latest_scans.get(query, set())
+        for node_type, relation in sorted(latest):
+            if node_type == 'Seq Scan' and relation in WATCHED_SEQ_SCANS:
+                regressions.append(f"Seq Scan on {relation}")
+        for node_type, relation in sorted(latest - baseline_scans.get(query, set())):
+            if node_type == 'Seq Scan' and relation not in WATCHED_SEQ_SCANS:
+                regressions.append(f"new Seq Scan on {relation}")
+
+        summary[query] = {
+            'runs': len(errors[query]),
+            'errors': sum(errors[query]),
+            'timed_runs': len(histogram.samples),
+            'p50': histogram.percentile(50),
+            'p95': histogram.percentile(95),
+            'p99': histogram.percentile(99),
+            'phases_p50': {
+                name: phase_histograms[query][name].percentile(50)
+                for name in PHASES if name in phase_histograms[query]
+            },
+            'planning_p50': planning_histograms[query].percentile(50),
+            'execution_p50': execution_histograms[query].percentile(50),
+            'buckets': histogram.buckets(),
+            'regressions': regressions,
+        }
+    return summary
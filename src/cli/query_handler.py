@@ -1,50 +1,33 @@
 import psycopg2
 from psycopg2.extras import RealDictCursor
-import time
-from tqdm import tqdm
-from datetime import datetime
+from cli.profiler import QueryProfiler
 
 
 class QueryHandler:
-    def __init__(self, db_connection):
-        self.db_connection = db_connection
-
-    def get_open_orders(self):
-        """Get open orders by delivery date and status"""
-        query = """
+    # Business queries served by the CLI, keyed by query name
+    QUERIES = {
+        'open_orders': """
             SELECT delivery_date, status, COUNT(*) AS order_count
             FROM analytics.fact_orders
             WHERE status IN ('PENDING', 'PROCESSING')
             GROUP BY delivery_date, status
             ORDER BY delivery_date, status;
-        """
-        return self._execute_query(query)
-
-    def get_top_delivery_dates(self):
-        """Get top 3 delivery dates with most open orders"""
-        query = """
+        """,
+        'top_delivery_dates': """
             SELECT delivery_date, COUNT(*) AS order_count
             FROM analytics.fact_orders
             WHERE status IN ('PENDING', 'PROCESSING')
             GROUP BY delivery_date
             ORDER BY order_count DESC
             LIMIT 3;
-        """
-        return self._execute_query(query)
-
-    def get_pending_items(self):
-        """Get pending items by product ID"""
-        query = """
+        """,
+        'pending_items': """
             SELECT product_id, SUM(quantity) AS pending_quantity
             FROM analytics.fact_orders
             WHERE status IN ('PENDING', 'PROCESSING')
             GROUP BY product_id;
-        """
-        return self._execute_query(query)
-
-    def get_top_customers(self):
-        """Get top 3 customers with most pending orders"""
-        query = """
+        """,
+        'top_customers': """
             SELECT c.customer_id, c.customer_name, COUNT(*) AS pending_order_count
             FROM analytics.fact_orders o
             JOIN analytics.dim_customers c ON o.customer_id = c.customer_id
@@ -52,45 +35,52 @@ class QueryHandler:
             GROUP BY c.customer_id, c.customer_name
             ORDER BY pending_order_count DESC
             LIMIT 3;
-        """
-        return self._execute_query(query)
+        """,
+    }
+
+    def __init__(self, db_connection, profiler=None):
+        self.db_connection = db_connection
+        self.profiler = profiler or QueryProfiler()
 
-    def _execute_query(self, query, timeout=30):
+    def get_open_orders(self):
+        """Get open orders by delivery date and status"""
+        return self._execute_query('open_orders', self.QUERIES['open_orders'])
+
+    def get_top_delivery_dates(self):
+        """Get top 3 delivery dates with most open orders"""
+        return self._execute_query('top_delivery_dates', self.QUERIES['top_delivery_dates'])
+
+    def get_pending_items(self):
+        """Get pending items by product ID"""
+        return self._execute_query('pending_items', self.QUERIES['pending_items'])
+
+    def get_top_customers(self):
+        """Get top 3 customers with most pending orders"""
+        return self._execute_query('top_customers', self.QUERIES['top_customers'])
+
+    def _execute_query(self, query_name, query, timeout=30):
         """Execute query with timeout and return results"""
+        # SET LOCAL is sent with the first statement to avoid an extra round-trip
+        statement_timeout = f"SET LOCAL statement_timeout = {timeout * 1000};"
         try:
-            start_time = time.time()
             with self.db_connection.cursor(cursor_factory=RealDictCursor) as cursor:
-                # Set statement timeout
-                cursor.execute(f"SET statement_timeout = {timeout * 1000};")
-                
-                # Execute main query with progress bar
-                with tqdm(total=100, desc="Executing query", unit="%") as pbar:
-                    cursor.execute(query)
-                    pbar.update(50)  # Query execution started
+                if self.profiler.enabled:
+                    with self.profiler.phase('plan'):
+                        cursor.execute(f"{statement_timeout} {self.profiler.explain_statement(query)}")
+                        self.profiler.attach_plan(cursor.fetchone()['QUERY PLAN'])
+                    statement_timeout = ""
+
+                with self.profiler.phase('execute'):
+                    cursor.execute(f"{statement_timeout} {query}")
+                with self.profiler.phase('fetch'):
                     results = cursor.fetchall()
-                    pbar.update(50)  # Results fetched
                 
                 # Validate results
                 if not results:
                     raise ValueError("No data returned from query")
                 
-                # Log query performance
-                execution_time = time.time() - start_time
-                self._log_query_performance(query, execution_time, len(results))
-                
                 return results
         except psycopg2.Error as e:
             raise Exception(f"Database error: {str(e)}")
         except Exception as e:
             raise Exception(f"Query execution error: {str(e)}")
-
-    def _log_query_performance(self, query, execution_time, result_count):
-        """Log query performance metrics"""
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        log_message = (
-            f"[{timestamp}] Query executed in {execution_time:.2f}s, "
-            f"returned {result_count} rows\n"
-            f"Query: {query[:200]}..."  # Log first 200 chars of query
-        )
-        with open("query_performance.log", "a") as log_file:
-            log_file.write(log_message + "\n")
@@ -0,0 +1,378 @@
+import logging
+import statistics
+import time
+from psycopg2 import sql
+from psycopg2.extras import RealDictCursor
+from cli.query_handler import QueryHandler
+from pipeline.cdc_handler import CDCHandler
+
+logger = logging.getLogger(__name__)
+
+OPEN_STATUS_PREDICATE = "WHERE status IN ('PENDING', 'PROCESSING')"
+
+# Secondary indexes on analytics.fact_orders, keyed by index set name.
+# db-scripts/analytical_schema.sql deliberately keeps creating the 'current'
+# set; environments built from it need the generated migration as well.
+INDEX_SETS = {
+    # Mirrors db-scripts/analytical_schema.sql
+    'current': {
+        'idx_fact_orders_status': "(status)",
+        'idx_fact_orders_delivery_date': "(delivery_date)",
+        'idx_fact_orders_customer_id': "(customer_id)",
+        'idx_fact_orders_product_id': "(product_id)",
+        'idx_fact_orders_partition_key': "(delivery_date)",
+        'idx_fact_orders_status_date': "(status, delivery_date)",
+        'idx_fact_orders_customer_status': "(customer_id, status)",
+        'idx_fact_orders_product_status': "(product_id, status)",
+    },
+    # Fixed candidate: partial indexes over open orders only, covering each CLI query
+    'lean': {
+        'idx_fact_orders_open_delivery_date': f"(delivery_date, status) {OPEN_STATUS_PREDICATE}",
+        'idx_fact_orders_open_product': f"(product_id) INCLUDE (quantity) {OPEN_STATUS_PREDICATE}",
+        'idx_fact_orders_open_customer': f"(customer_id) {OPEN_STATUS_PREDICATE}",
+    },
+}
+
+# Derived from the current indexes by SchemaAdvisor.resolve_index_set
+ADVISED_INDEX_SET = 'advised'
+
+# Single-column indexes with at most this many distinct values are flagged
+LOW_SELECTIVITY_DISTINCT = 10
+
+# Status changes replayed by the upsert workload, following the transitions
+# of the transactional database; COMPLETED orders are never reopened
+STATUS_TRANSITIONS = {
+    'PENDING': 'PROCESSING',
+    'PROCESSING': 'COMPLETED',
+    'REPROCESSING': 'COMPLETED',
+}
+
+
+class SchemaAdvisor:
+    """Benchmarks secondary index sets on analytics.fact_orders
+
+    Every index set is installed, measured and rolled back inside a single
+    transaction, so benchmarking leaves the schema and data untouched. The
+    transaction holds an exclusive lock on fact_orders while it runs, so only
+    point the advisor at a local analytics database.
+    """
+
+    PROBE_INDEX = 'idx_fact_orders_advisor_probe'
+
+    def __init__(self, db_connection):
+        self.db_connection = db_connection
+
+    def index_stats(self):
+        """Get usage and size of the secondary indexes on fact_orders
+
+        pg_stat_user_indexes only tracks the per-partition indexes, so they are
+        rolled up to their parent partitioned index. Autovacuum never analyzes
+        the partitioned parent either, so column statistics fall back to the
+        partitions.
+        """
+        query = """
+            SELECT parent.relname AS index_name,
+                   pg_get_indexdef(parent.oid) AS definition,
+                   COALESCE(SUM(s.idx_scan), 0) AS idx_scan,
+                   COALESCE(SUM(pg_relation_size(s.indexrelid)), 0) AS size_bytes
+            FROM pg_index pi
+            JOIN pg_class parent ON parent.oid = pi.indexrelid
+            LEFT JOIN pg_inherits inh ON inh.inhparent = parent.oid
+            LEFT JOIN pg_stat_user_indexes s ON s.indexrelid = inh.inhrelid
+            WHERE pi.indrelid = 'analytics.fact_orders'::regclass
+              AND NOT pi.indisprimary
+            GROUP BY parent.relname, parent.oid
+            ORDER BY parent.relname;
+        """
+        with self.db_connection.cursor(cursor_factory=RealDictCursor) as cursor:
+            cursor.execute(query)
+            stats = cursor.fetchall()
+            cursor.execute("""
+                SELECT s.attname, s.inherited, s.n_distinct
+                FROM pg_stats s
+                WHERE s.schemaname = 'analytics'
+                  AND ((s.tablename = 'fact_orders' AND s.inherited)
+                    OR (NOT s.inherited AND s.tablename IN (
+                        SELECT c.relname
+                        FROM pg_inherits inh
+                        JOIN pg_class c ON c.oid = inh.inhrelid
+                        WHERE inh.inhparent = 'analytics.fact_orders'::regclass
+                    )));
+            """)
+            n_distinct = column_distinct(cursor.fetchall())
+        self.db_connection.rollback()
+
+        return annotate_indexes(stats, n_distinct)
+
+    def resolve_index_set(self, index_set, stats=None):
+        """Get the indexes of a named set; 'advised' is derived from index_stats"""
+        if index_set == ADVISED_INDEX_SET:
+            return propose_index_set(stats if stats is not None else self.index_stats())
+        return dict(INDEX_SETS[index_set])
+
+    def sample_orders(self, sample_size):
+        """Get a random sample of fact_orders rows for the upsert workload
+
+        Sampling uniformly keeps open and closed orders in their real proportions.
+        """
+        with self.db_connection.cursor(cursor_factory=RealDictCursor) as cursor:
+            cursor.execute("""
+                SELECT order_id, order_date, delivery_date, customer_id, product_id, status, quantity
+                FROM analytics.fact_orders
+                ORDER BY random()
+                LIMIT %s;
+            """, (sample_size,))
+            rows = cursor.fetchall()
+        self.db_connection.rollback()
+        if not rows:
+            raise ValueError("No rows in analytics.fact_orders to build the upsert workload from")
+        return rows
+
+    def benchmark(self, indexes, sample, repeat=5):
+        """Measure query latency and upsert throughput for an index set
+
+        Args:
+            indexes (dict): Index definitions keyed by index name
+            sample (list): Rows replayed as CDC upserts
+            repeat (int): Number of timed runs per query and upsert pass
+
+        Returns:
+            dict: Median latency and index scans per query, median upsert throughput
+        """
+        try:
+            with self.db_connection.cursor(cursor_factory=RealDictCursor) as cursor:
+                self._install_index_set(cursor, indexes)
+                cursor.execute("ANALYZE analytics.fact_orders;")
+
+                queries = {}
+                for name, query in QueryHandler.QUERIES.items():
+                    # Untimed warm-up so neither index set runs on a cold cache
+                    cursor.execute(query)
+                    cursor.fetchall()
+                    timings = []
+                    index_scans = set()
+                    for _ in range(repeat):
+                        cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {query}")
+                        plan = cursor.fetchone()['QUERY PLAN'][0]
+                        timings.append(plan['Planning Time'] + plan['Execution Time'])
+                        index_scans.update(_collect_index_scans(plan['Plan']))
+                    queries[name] = {
+                        'latency_ms': statistics.median(timings),
+                        'index_scans': sorted(index_scans),
+                    }
+
+                # The first pass is an untimed warm-up; every pass is rolled back
+                # to the savepoint so all of them replay the same status changes
+                upsert_rates = []
+                for upsert_pass in range(repeat + 1):
+                    cursor.execute("SAVEPOINT upsert_pass;")
+                    elapsed = self._replay_upserts(cursor, sample)
+                    cursor.execute("ROLLBACK TO SAVEPOINT upsert_pass;")
+                    if upsert_pass:
+                        upsert_rates.append(len(sample) / elapsed)
+
+            return {
+                'queries': queries,
+                'upserts_per_sec': statistics.median(upsert_rates),
+            }
+        finally:
+            self.db_connection.rollback()
+
+    def migration_sql(self, indexes):
+        """Build the migration replacing the secondary indexes with an index set"""
+        try:
+            with self.db_connection.cursor(cursor_factory=RealDictCursor) as cursor:
+                drop, create = self._index_changes(cursor, indexes)
+        finally:
+            self.db_connection.rollback()
+
+        statements = ["BEGIN;"]
+        for name in drop:
+            statements.append(f"DROP INDEX IF EXISTS analytics.{name};")
+        for name in create:
+            statements.append(f"CREATE INDEX {name} ON analytics.fact_orders {indexes[name]};")
+        statements.append("ANALYZE analytics.fact_orders;")
+        statements.append("COMMIT;")
+        return "\n".join(statements) + "\n"
+
+    def apply(self, indexes):
+        """Replace the secondary indexes on fact_orders with an index set"""
+        try:
+            with self.db_connection.cursor(cursor_factory=RealDictCursor) as cursor:
+                self._install_index_set(cursor, indexes)
+                cursor.execute("ANALYZE analytics.fact_orders;")
+            self.db_connection.commit()
+            logger.info(f"Applied {len(indexes)} secondary indexes to analytics.fact_orders")
+        except Exception as e:
+            self.db_connection.rollback()
+            logger.error(f"Error applying index set: {str(e)}")
+            raise
+
+    def _replay_upserts(self, cursor, sample):
+        """Replay the sample as CDC upserts and return the elapsed seconds"""
+        start = time.perf_counter()
+        for row in sample:
+            # Move open orders one step forward; closed orders are rewritten as is
+            status = STATUS_TRANSITIONS.get(row['status'], row['status'])
+            cursor.execute(CDCHandler.ORDER_UPSERT_QUERY, (
+                row['order_id'],
+                row['order_date'],
+                row['delivery_date'],
+                row['customer_id'],
+                row['product_id'],
+                status,
+                row['quantity']
+            ))
+        return time.perf_counter() - start
+
+    def _index_changes(self, cursor, indexes):
+        """Compare the existing secondary indexes with an index set by definition"""
+        cursor.execute("""
+            SELECT c.relname AS index_name, pg_get_indexdef(c.oid) AS definition
+            FROM pg_index i
+            JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE i.indrelid = 'analytics.fact_orders'::regclass AND NOT i.indisprimary;
+        """)
+        existing = {row['index_name']: index_key(row['definition']) for row in cursor.fetchall()}
+        target = {name: self._normalized_key(cursor, definition) for name, definition in indexes.items()}
+        return plan_index_changes(existing, target)
+
+    def _normalized_key(self, cursor, definition):
+        """Get the index key PostgreSQL reports for an index definition
+
+        An index created ON ONLY the partitioned parent is not built on the
+        partitions, so probing the definition is cheap.
+        """
+        probe = sql.Identifier(self.PROBE_INDEX)
+        cursor.execute(sql.SQL("CREATE INDEX {} ON ONLY analytics.fact_orders ").format(probe)
+                       + sql.SQL(definition + ";"))
+        cursor.execute("SELECT pg_get_indexdef(%s::regclass) AS definition;",
+                       (f"analytics.{self.PROBE_INDEX}",))
+        key = index_key(cursor.fetchone()['definition'])
+        cursor.execute(sql.SQL("DROP INDEX analytics.{};").format(probe))
+        return key
+
+    def _install_index_set(self, cursor, indexes):
+        """Drop secondary indexes outside the set and create the missing ones"""
+        drop, create = self._index_changes(cursor, indexes)
+        for name in drop:
+            cursor.execute(sql.SQL("DROP INDEX analytics.{};").format(sql.Identifier(name)))
+        for name in create:
+            cursor.execute(sql.SQL("CREATE INDEX {} ON analytics.fact_orders ").format(
+                sql.Identifier(name)
+            ) + sql.SQL(indexes[name] + ";"))
+
+
+def propose_index_set(stats):
+    """Derive an index set from the current indexes and their usage
+
+    Unused, duplicate and low-selectivity indexes are dropped and the partial
+    and covering indexes of the 'lean' set are added.
+
+    Args:
+        stats (list): Index rows as returned by SchemaAdvisor.index_stats
+
+    Returns:
+        dict: Index definitions keyed by index name
+    """
+    indexes = {}
+    for index in stats:
+        if index['idx_scan'] == 0 or index['duplicate_of'] or index['low_selectivity']:
+            continue
+        indexes[index['index_name']] = f"USING {index_key(index['definition'])}"
+    indexes.update(INDEX_SETS['lean'])
+    return indexes
+
+
+def plan_index_changes(existing, target):
+    """Work out which indexes to drop and create to reach a target index set
+
+    Args:
+        existing (dict): Index keys of the existing indexes, keyed by name
+        target (dict): Index keys of the target indexes, keyed by name
+
+    Returns:
+        tuple: (names to drop, names to create); an index whose name is in the
+        target with a different definition is in both
+    """
+    drop = []
+    create = []
+    for name, key in sorted(existing.items()):
+        if name not in target:
+            drop.append(name)
+        elif key != target[name]:
+            logger.warning(f"Index {name} exists with a different definition, recreating it")
+            drop.append(name)
+            create.append(name)
+    for name in target:
+        if name not in existing:
+            create.append(name)
+    return drop, create
+
+
+def index_key(definition):
+    """Strip the index name from a pg_get_indexdef definition
+
+    Two indexes with the same key are duplicates.
+    """
+    return definition.split(' USING ', 1)[-1]
+
+
+def index_columns(key):
+    """Get the key columns of an index key, ignoring INCLUDE and WHERE clauses"""
+    columns = key.split('(', 1)[-1].split(')', 1)[0]
+    return [column.strip() for column in columns.split(',')]
+
+
+def column_distinct(rows):
+    """Map column names to n_distinct from pg_stats rows
+
+    Statistics of the partitioned parent are used when present, otherwise the
+    highest n_distinct of its partitions.
+    """
+    parent = {}
+    partitions = {}
+    for row in rows:
+        if row['inherited']:
+            parent[row['attname']] = row['n_distinct']
+        else:
+            partitions[row['attname']] = max(
+                partitions.get(row['attname'], row['n_distinct']), row['n_distinct']
+            )
+    return {**partitions, **parent}
+
+
+def annotate_indexes(stats, n_distinct):
+    """Flag duplicate and low-selectivity indexes
+
+    Args:
+        stats (list): Index rows with index_name and definition
+        n_distinct (dict): n_distinct per column, as returned by column_distinct
+
+    Returns:
+        list: The same rows with duplicate_of and low_selectivity set
+    """
+    seen = {}
+    for index in stats:
+        key = index_key(index['definition'])
+        index['duplicate_of'] = seen.setdefault(key, index['index_name'])
+        if index['duplicate_of'] == index['index_name']:
+            index['duplicate_of'] = None
+
+        columns = index_columns(key)
+        distinct = n_distinct.get(columns[0])
+        index['low_selectivity'] = (
+            len(columns) == 1 and ' WHERE ' not in key
+            and distinct is not None and 0 < distinct <= LOW_SELECTIVITY_DISTINCT
+        )
+    return stats
+
+
+def _collect_index_scans(plan_node):
+    """Collect every index scan in a plan tree as '<node type> using <index>'"""
+    index_scans = set()
+    if 'Index Name' in plan_node:
+        index_scans.add(f"{plan_node['Node Type']} using {plan_node['Index Name']}")
+    for child in plan_node.get('Plans', []):
+        index_scans.update(_collect_index_scans(child))
+    return index_scans
@@ -18,6 +18,19 @@ class CDCHandler:
         'pending_items_by_product',
         'top3_customers_pending_orders'
     ]
+    ORDER_UPSERT_QUERY = sql.SQL("""
+        INSERT INTO analytics.fact_orders 
+        (order_id, order_date, delivery_date, customer_id, product_id, status, quantity, updated_at)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, NOW())
+        ON CONFLICT (order_id, delivery_date) DO UPDATE SET
+            order_date = EXCLUDED.order_date,
+            delivery_date = EXCLUDED.delivery_date,
+            customer_id = EXCLUDED.customer_id,
+            product_id = EXCLUDED.product_id,
+            status = EXCLUDED.status,
+            quantity = EXCLUDED.quantity,
+            updated_at = NOW();
+    """)
 
     def __init__(self, source_db, target_db):
         self.source_db = source_db
@@ -241,20 +254,7 @@ class CDCHandler:
         """Process changes to the orders table"""
         try:
             with self.target_db.cursor() as cursor:
-                query = sql.SQL("""
-                    INSERT INTO analytics.fact_orders 
-                    (order_id, order_date, delivery_date, customer_id, product_id, status, quantity, updated_at)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, NOW())
-                    ON CONFLICT (order_id, delivery_date) DO UPDATE SET
-                        order_date = EXCLUDED.order_date,
-                        delivery_date = EXCLUDED.delivery_date,
-                        customer_id = EXCLUDED.customer_id,
-                        product_id = EXCLUDED.product_id,
-                        status = EXCLUDED.status,
-                        quantity = EXCLUDED.quantity,
-                        updated_at = NOW();
-                """)
-                cursor.execute(query, (
+                cursor.execute(self.ORDER_UPSERT_QUERY, (
                     change_data['order_id'],
                     change_data['order_date'],
                     change_data['delivery_date'],
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Mirror PYTHONPATH=/app/src used by the pipeline image
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
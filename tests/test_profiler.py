@@ -0,0 +1,204 @@
+import json
+
+from cli.profiler import (
+    QueryProfiler,
+    RollingHistogram,
+    extract_scans,
+    read_profile_log,
+    summarize_profile,
+)
+
+
+def _plan(node_type, relation):
+    return {
+        'Node Type': 'Aggregate',
+        'Plans': [{'Node Type': node_type, 'Relation Name': relation}],
+    }
+
+
+def _entry(query, total_ms, scans=(), error=None):
+    return {
+        'query': query,
+        'total_ms': total_ms,
+        'phases_ms': {'execute': total_ms},
+        'scans': [list(scan) for scan in scans],
+        'error': error,
+    }
+
+
+def test_percentile_uses_nearest_rank():
+    histogram = RollingHistogram(window=100)
+    for latency in range(1, 101):
+        histogram.add(latency)
+
+    assert histogram.percentile(50) == 50
+    assert histogram.percentile(95) == 95
+    assert histogram.percentile(99) == 99
+
+
+def test_percentile_of_single_sample_and_empty_window():
+    histogram = RollingHistogram(window=10)
+    assert histogram.percentile(50) is None
+
+    histogram.add(7.5)
+    assert histogram.percentile(50) == 7.5
+    assert histogram.percentile(99) == 7.5
+
+
+def test_histogram_only_keeps_the_window():
+    histogram = RollingHistogram(window=3)
+    for latency in (1000, 1000, 1, 2, 3):
+        histogram.add(latency)
+
+    assert histogram.percentile(99) == 3
+    assert histogram.buckets()[1] == 1
+    assert histogram.buckets()[5] == 2
+    assert histogram.buckets()[1000] == 0
+
+
+def test_histogram_buckets_overflow():
+    histogram = RollingHistogram()
+    histogram.add(0.5)
+    histogram.add(20000)
+
+    buckets = histogram.buckets()
+    assert buckets[1] == 1
+    assert buckets[None] == 1
+
+
+def test_extract_scans_walks_nested_plans():
+    plan = {
+        'Node Type': 'Hash Join',
+        'Plans': [
+            _plan('Seq Scan', 'fact_orders_2024'),
+            {'Node Type': 'Index Scan', 'Relation Name': 'dim_customers'},
+        ],
+    }
+
+    assert extract_scans(plan) == [
+        ['Seq Scan', 'fact_orders_2024'],
+        ['Index Scan', 'dim_customers'],
+    ]
+    assert extract_scans({}) == []
+
+
+def test_summary_flags_seq_scan_of_default_partition():
+    entries = [_entry('open_orders', 10, [('Index Only Scan', 'fact_orders_default')])]
+    entries.append(_entry('open_orders', 12, [('Seq Scan', 'fact_orders_default')]))
+
+    summary = summarize_profile(entries)
+
+    assert summary['open_orders']['regressions'] == ['Seq Scan on fact_orders_default']
+
+
+def test_summary_flags_seq_scans_missing_from_baseline_plan():
+    entries = [
+        _entry('pending_items', 10, [('Seq Scan', 'fact_orders_2024')]),
+        _entry('pending_items', 10, [('Seq Scan', 'fact_orders_2024'), ('Seq Scan', 'fact_orders_2025')]),
+    ]
+
+    summary = summarize_profile(entries)
+
+    assert summary['pending_items']['regressions'] == ['new Seq Scan on fact_orders_2025']
+
+
+def test_summary_ignores_entries_without_plans_for_regressions():
+    entries = [
+        _entry('top_customers', 10, [('Index Scan', 'fact_orders_2024')]),
+        _entry('top_customers', 10),
+    ]
+
+    assert summarize_profile(entries)['top_customers']['regressions'] == []
+
+
+def test_summary_counts_errors_within_window():
+    entries = [
+        _entry('open_orders', 30000, error='canceling statement due to statement timeout'),
+        _entry('open_orders', 10),
+        _entry('open_orders', 12, error='No data returned from query'),
+    ]
+
+    summary = summarize_profile(entries)['open_orders']
+    assert summary['runs'] == 3
+    assert summary['errors'] == 2
+    assert summarize_profile(entries, window=2)['open_orders']['errors'] == 1
+
+
+def test_summary_percentiles_exclude_failed_runs():
+    entries = [
+        _entry('open_orders', 90000, error='Failed to connect to database after 10 attempts'),
+        _entry('open_orders', 0, error='No data returned from query'),
+        _entry('open_orders', 10),
+        _entry('open_orders', 12),
+    ]
+
+    summary = summarize_profile(entries)['open_orders']
+    assert summary['timed_runs'] == 2
+    assert summary['p50'] == 10
+    assert summary['p99'] == 12
+
+
+def test_summary_percentiles_exclude_explain_analyze_runs():
+    explained = _entry('open_orders', 100, [('Seq Scan', 'fact_orders_default')])
+    explained.update({'explain_analyze': True, 'planning_ms': 0.5, 'execution_ms': 48.0})
+    entries = [_entry('open_orders', 50), explained]
+
+    summary = summarize_profile(entries)['open_orders']
+    assert summary['runs'] == 2
+    assert summary['p99'] == 50
+    assert summary['planning_p50'] == 0.5
+    assert summary['execution_p50'] == 48.0
+    assert summary['regressions'] == ['Seq Scan on fact_orders_default']
+
+
+def test_summary_without_successful_runs_has_no_percentiles():
+    summary = summarize_profile([_entry('top_customers', 5, error='boom')])['top_customers']
+
+    assert summary['errors'] == 1
+    assert summary['p50'] is None
+
+
+def test_profiler_records_and_flushes_json_lines(tmp_path):
+    log_path = tmp_path / 'profile.jsonl'
+    profiler = QueryProfiler(log_path=str(log_path), enabled=True)
+
+    with profiler.phase('execute'):
+        pass
+    profiler.attach_plan([{'Plan': _plan('Seq Scan', 'fact_orders_default'), 'Execution Time': 1.5}])
+    profiler.count_connect_retry()
+    profiler.record('open_orders', 0, error='No data returned from query')
+    assert profiler.flush()
+
+    entries = read_profile_log(str(log_path))
+    assert len(entries) == 1
+    assert entries[0]['error'] == 'No data returned from query'
+    assert entries[0]['connect_retries'] == 1
+    assert entries[0]['execution_ms'] == 1.5
+    assert entries[0]['scans'] == [['Seq Scan', 'fact_orders_default']]
+    assert set(entries[0]['phases_ms']) == {'execute'}
+
+
+def test_disabled_profiler_records_nothing(tmp_path):
+    log_path = tmp_path / 'profile.jsonl'
+    profiler = QueryProfiler(log_path=str(log_path))
+
+    with profiler.phase('execute'):
+        pass
+    profiler.record('open_orders', 3)
+
+    assert profiler.flush()
+    assert not log_path.exists()
+
+
+def test_flush_reports_unwritable_log(tmp_path):
+    profiler = QueryProfiler(log_path=str(tmp_path / 'missing' / 'profile.jsonl'), enabled=True)
+    profiler.record('open_orders', 3)
+
+    assert profiler.flush() is False
+
+
+def test_read_profile_log_skips_malformed_lines(tmp_path):
+    log_path = tmp_path / 'profile.jsonl'
+    log_path.write_text(json.dumps(_entry('open_orders', 1)) + "\nnot json\n\n")
+
+    assert len(read_profile_log(str(log_path))) == 1
@@ -0,0 +1,140 @@
+import pytest
+
+import cli.main as cli_main
+import cli.profiler as profiler_module
+from cli.profiler import QueryProfiler
+from cli.query_handler import QueryHandler
+
+STATEMENT_SECONDS = 0.05
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def perf_counter(self):
+        return self.now
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self._result = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def execute(self, statement, params=None):
+        self.connection.statements.append(statement)
+        self.connection.clock.now += STATEMENT_SECONDS
+        if 'EXPLAIN' in statement:
+            self._result = [{'QUERY PLAN': [self.connection.plan]}]
+        else:
+            self._result = self.connection.rows
+
+    def fetchone(self):
+        return self._result[0]
+
+    def fetchall(self):
+        return self._result
+
+
+class FakeConnection:
+    def __init__(self, clock, rows):
+        self.clock = clock
+        self.rows = rows
+        self.statements = []
+        self.plan = {
+            'Plan': {'Node Type': 'Seq Scan', 'Relation Name': 'fact_orders_default'},
+            'Planning Time': 0.2,
+            'Execution Time': 49.0,
+        }
+
+    def cursor(self, cursor_factory=None):
+        return FakeCursor(self)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(profiler_module, 'time', clock)
+    return clock
+
+
+def test_statement_timeout_is_sent_with_the_query():
+    connection = FakeConnection(FakeClock(), [{'order_count': 1}])
+
+    QueryHandler(connection).get_open_orders()
+
+    assert len(connection.statements) == 1
+    assert connection.statements[0].startswith("SET LOCAL statement_timeout = 30000; ")
+    assert QueryHandler.QUERIES['open_orders'] in connection.statements[0]
+
+
+def test_profiled_query_sends_timeout_with_explain_only(clock):
+    connection = FakeConnection(clock, [{'order_count': 1}])
+    profiler = QueryProfiler(enabled=True)
+
+    QueryHandler(connection, profiler).get_open_orders()
+
+    explain, query = connection.statements
+    assert explain.startswith("SET LOCAL statement_timeout = 30000; EXPLAIN (FORMAT JSON) ")
+    assert 'statement_timeout' not in query
+    assert list(profiler._phases) == ['plan', 'execute', 'fetch']
+
+
+def test_explain_analyze_is_left_out_of_total(clock):
+    connection = FakeConnection(clock, [{'order_count': 1}])
+    profiler = QueryProfiler(enabled=True, explain_analyze=True)
+
+    QueryHandler(connection, profiler).get_open_orders()
+    profiler.record('open_orders', 1)
+
+    entry = profiler._buffer[0]
+    assert 'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON)' in connection.statements[0]
+    assert entry['phases_ms']['plan'] == pytest.approx(50.0)
+    assert entry['phases_ms']['execute'] == pytest.approx(50.0)
+    assert entry['total_ms'] == pytest.approx(50.0)
+    assert entry['planning_ms'] == 0.2
+    assert entry['execution_ms'] == 49.0
+    assert entry['explain_analyze'] is True
+
+
+def test_empty_result_raises():
+    connection = FakeConnection(FakeClock(), [])
+
+    with pytest.raises(Exception, match="No data returned from query"):
+        QueryHandler(connection).get_open_orders()
+
+
+def test_export_query_records_failed_runs(clock, monkeypatch, tmp_path):
+    connection = FakeConnection(clock, [])
+    monkeypatch.setattr(cli_main, 'create_analytical_db_connection', lambda **kwargs: connection)
+    profiler = QueryProfiler(enabled=True)
+
+    with pytest.raises(Exception, match="No data returned from query"):
+        cli_main._export_query(profiler, 'open_orders', str(tmp_path / 'open_orders.csv'))
+
+    entry = profiler._buffer[0]
+    assert entry['query'] == 'open_orders'
+    assert entry['rows'] == 0
+    assert "No data returned from query" in entry['error']
+    assert set(entry['phases_ms']) == {'connect', 'plan', 'execute', 'fetch'}
+
+
+def test_export_query_records_successful_runs(clock, monkeypatch, tmp_path):
+    connection = FakeConnection(clock, [{'delivery_date': '2024-01-01', 'order_count': 2}])
+    monkeypatch.setattr(cli_main, 'create_analytical_db_connection', lambda **kwargs: connection)
+    profiler = QueryProfiler(enabled=True)
+    output = tmp_path / 'open_orders.csv'
+
+    cli_main._export_query(profiler, 'open_orders', str(output))
+
+    entry = profiler._buffer[0]
+    assert entry['rows'] == 1
+    assert entry['error'] is None
+    assert 'write' in entry['phases_ms']
+    assert output.exists()
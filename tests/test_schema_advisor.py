@@ -0,0 +1,202 @@
+from cli.schema_advisor import (
+    INDEX_SETS,
+    STATUS_TRANSITIONS,
+    SchemaAdvisor,
+    _collect_index_scans,
+    annotate_indexes,
+    plan_index_changes,
+    propose_index_set,
+    column_distinct,
+    index_columns,
+    index_key,
+)
+
+
+def _index(name, definition):
+    return {'index_name': name, 'definition': definition}
+
+
+def _current_schema_indexes():
+    # pg_get_indexdef output for the indexes in db-scripts/analytical_schema.sql
+    return [
+        _index(name, f"CREATE INDEX {name} ON ONLY analytics.fact_orders USING btree {columns}")
+        for name, columns in sorted(INDEX_SETS['current'].items())
+    ]
+
+
+def test_index_key_strips_the_index_name():
+    assert index_key(
+        "CREATE INDEX idx_a ON ONLY analytics.fact_orders USING btree (delivery_date)"
+    ) == "btree (delivery_date)"
+
+
+def test_index_columns_ignores_include_and_where():
+    key = "btree (product_id) INCLUDE (quantity) WHERE ((status)::text = ANY (ARRAY['PENDING']))"
+
+    assert index_columns(key) == ['product_id']
+    assert index_columns("btree (status, delivery_date)") == ['status', 'delivery_date']
+
+
+def test_duplicate_delivery_date_index_is_flagged():
+    stats = annotate_indexes(_current_schema_indexes(), {})
+    duplicates = {index['index_name']: index['duplicate_of'] for index in stats if index['duplicate_of']}
+
+    assert duplicates == {'idx_fact_orders_partition_key': 'idx_fact_orders_delivery_date'}
+
+
+def test_only_single_column_status_index_is_low_selectivity():
+    stats = annotate_indexes(_current_schema_indexes(), {'status': 4, 'delivery_date': -0.01})
+    flagged = [index['index_name'] for index in stats if index['low_selectivity']]
+
+    assert flagged == ['idx_fact_orders_status']
+
+
+def test_partial_indexes_are_not_low_selectivity():
+    stats = annotate_indexes([
+        _index('idx_open', "CREATE INDEX idx_open ON ONLY analytics.fact_orders USING btree (status) "
+                           "WHERE ((status)::text = ANY (ARRAY['PENDING'::text, 'PROCESSING'::text]))"),
+    ], {'status': 4})
+
+    assert not stats[0]['low_selectivity']
+
+
+def test_column_distinct_falls_back_to_partitions():
+    rows = [
+        {'attname': 'status', 'inherited': False, 'n_distinct': 3},
+        {'attname': 'status', 'inherited': False, 'n_distinct': 4},
+        {'attname': 'order_id', 'inherited': False, 'n_distinct': -1},
+    ]
+
+    assert column_distinct(rows) == {'status': 4, 'order_id': -1}
+
+
+def test_column_distinct_prefers_parent_statistics():
+    rows = [
+        {'attname': 'status', 'inherited': False, 'n_distinct': 3},
+        {'attname': 'status', 'inherited': True, 'n_distinct': 5},
+    ]
+
+    assert column_distinct(rows) == {'status': 5}
+
+
+def test_status_transitions_never_reopen_completed_orders():
+    assert 'COMPLETED' not in STATUS_TRANSITIONS
+    assert STATUS_TRANSITIONS['PROCESSING'] == 'COMPLETED'
+    assert 'PENDING' not in STATUS_TRANSITIONS.values()
+
+
+def test_collect_index_scans_walks_nested_plans():
+    plan = {
+        'Node Type': 'Append',
+        'Plans': [
+            {'Node Type': 'Index Only Scan', 'Index Name': 'fact_orders_2024_product_id_quantity_idx'},
+            {'Node Type': 'Aggregate', 'Plans': [
+                {'Node Type': 'Bitmap Index Scan', 'Index Name': 'fact_orders_2025_customer_id_idx'},
+                {'Node Type': 'Seq Scan', 'Relation Name': 'fact_orders_default'},
+            ]},
+        ],
+    }
+
+    assert _collect_index_scans(plan) == {
+        'Index Only Scan using fact_orders_2024_product_id_quantity_idx',
+        'Bitmap Index Scan using fact_orders_2025_customer_id_idx',
+    }
+
+
+def test_advised_set_drops_flagged_indexes_and_adds_partial_indexes():
+    stats = annotate_indexes(_current_schema_indexes(), {'status': 4})
+    for index in stats:
+        index['idx_scan'] = 0 if index['index_name'] == 'idx_fact_orders_product_id' else 10
+
+    advised = propose_index_set(stats)
+
+    assert 'idx_fact_orders_status' not in advised
+    assert 'idx_fact_orders_partition_key' not in advised
+    assert 'idx_fact_orders_product_id' not in advised
+    assert advised['idx_fact_orders_status_date'] == "USING btree (status, delivery_date)"
+    assert set(INDEX_SETS['lean']) <= set(advised)
+
+
+def test_plan_index_changes_matches_by_definition():
+    existing = {
+        'idx_keep': "btree (customer_id)",
+        'idx_changed': "btree (status)",
+        'idx_extra': "btree (product_id)",
+    }
+    target = {
+        'idx_keep': "btree (customer_id)",
+        'idx_changed': "btree (status) WHERE ((status)::text = 'PENDING'::text)",
+        'idx_new': "btree (delivery_date)",
+    }
+
+    drop, create = plan_index_changes(existing, target)
+
+    assert drop == ['idx_changed', 'idx_extra']
+    assert create == ['idx_changed', 'idx_new']
+
+
+class FakeCursor:
+    def __init__(self, statements):
+        self.statements = statements
+        self._result = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def execute(self, statement, params=None):
+        statement = statement if isinstance(statement, str) else repr(statement)
+        self.statements.append(statement)
+        if 'EXPLAIN' in statement:
+            plan = {'Plan': {'Node Type': 'Seq Scan'}, 'Planning Time': 1.0, 'Execution Time': 2.0}
+            self._result = [{'QUERY PLAN': [plan]}]
+        elif '%s::regclass' in statement:
+            self._result = [{'definition': "CREATE INDEX probe ON ONLY analytics.fact_orders USING btree (x)"}]
+        else:
+            self._result = []
+
+    def fetchone(self):
+        return self._result[0]
+
+    def fetchall(self):
+        return self._result
+
+
+class FakeConnection:
+    def __init__(self):
+        self.statements = []
+        self.rollbacks = 0
+
+    def cursor(self, cursor_factory=None):
+        return FakeCursor(self.statements)
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+def test_benchmark_warms_up_and_rolls_back_every_upsert_pass():
+    connection = FakeConnection()
+    sample = [{
+        'order_id': 1, 'order_date': '2024-01-01', 'delivery_date': '2024-01-10',
+        'customer_id': 1, 'product_id': 1, 'status': 'PENDING', 'quantity': 2,
+    }]
+
+    result = SchemaAdvisor(connection).benchmark(INDEX_SETS['lean'], sample, repeat=3)
+
+    assert connection.statements.count("SAVEPOINT upsert_pass;") == 4
+    assert connection.statements.count("ROLLBACK TO SAVEPOINT upsert_pass;") == 4
+    assert result['upserts_per_sec'] > 0
+    assert result['queries']['open_orders']['latency_ms'] == 3.0
+    assert connection.rollbacks == 1
+
+
+def test_schema_advisor_rejects_non_positive_counts():
+    from click.testing import CliRunner
+    from cli.main import cli
+
+    for option in ('--repeat', '--upserts'):
+        result = CliRunner().invoke(cli, ['schema-advisor', option, '0'])
+        assert result.exit_code == 2
+        assert 'x>=1' in result.output